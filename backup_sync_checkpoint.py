@@ -0,0 +1,138 @@
+from datetime import datetime, timezone
+import json
+import os
+import threading
+import typing
+
+import backup_sync_model
+import backup_sync_schema
+
+
+class BackupSyncCheckpoint:
+    # cycle progress and unwritten folder names, persisted so a restart resumes instead of starting over
+    def __init__(self, *, path: typing.Optional[str] = None) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self.checkpoint = backup_sync_model.Checkpoint(destinations={})
+        self.resuming = False
+        self.save_failed = False
+
+        if self.path is not None and os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.checkpoint = backup_sync_schema.CheckpointSchema().load(json.load(f))
+            except Exception as e:
+                print('Error', f'ignoring unreadable checkpoint {self.path}')
+                print(e)
+
+    def _get_destination(self, host: str) -> backup_sync_model.DestinationCheckpoint:
+        if host not in self.checkpoint.destinations:
+            self.checkpoint.destinations[host] = backup_sync_model.DestinationCheckpoint(pending_names={},
+                                                                                         sources_completed={},
+                                                                                         folders_first_seen={},
+                                                                                         folders_last_synced={})
+        return self.checkpoint.destinations[host]
+
+    def get_remaining_wait(self, interval: float) -> float:
+        # a restart right after a completed cycle waits out the rest of the interval
+        with self.lock:
+            if self.checkpoint.cycle_completed is None or self._is_interrupted():
+                return 0
+            elapsed = (BackupSyncCheckpoint.now() - self.checkpoint.cycle_completed).total_seconds()
+            return min(interval, max(0, interval - elapsed))
+
+    def start_cycle(self) -> None:
+        with self.lock:
+            self.resuming = self._is_interrupted()
+            if not self.resuming:
+                self.checkpoint.cycle_started = BackupSyncCheckpoint.now()
+
+    def complete_cycle(self) -> None:
+        with self.lock:
+            self.resuming = False
+            self.checkpoint.cycle_completed = BackupSyncCheckpoint.now()
+        self.save()
+
+    def is_source_completed(self, destination_host: str, source_host: str) -> bool:
+        # only sources finished by an interrupted cycle are skipped, every other cycle is a full reconcile
+        with self.lock:
+            if not self.resuming:
+                return False
+            completed = self._get_destination(destination_host).sources_completed.get(source_host)
+            return completed is not None and completed >= self.checkpoint.cycle_started
+
+    def complete_source(self, destination_host: str, source_host: str) -> None:
+        with self.lock:
+            self._get_destination(destination_host).sources_completed[source_host] = BackupSyncCheckpoint.now()
+        self.save()
+
+    def get_pending_names(self, destination_host: str) -> typing.Dict[str, str]:
+        with self.lock:
+            return dict(self._get_destination(destination_host).pending_names)
+
+    def add_pending_names(self, destination_host: str, names: typing.Dict[str, str]) -> None:
+        if not names:
+            return
+        with self.lock:
+            self._get_destination(destination_host).pending_names.update(names)
+        self.save()
+
+    def clear_pending_names(self, destination_host: str, names: typing.Dict[str, str]) -> None:
+        if not names:
+            return
+        with self.lock:
+            pending_names = self._get_destination(destination_host).pending_names
+            for folder_id, name in names.items():
+                if pending_names.get(folder_id) == name:
+                    del pending_names[folder_id]
+        self.save()
+
+    def get_folder_sync_times(self) -> typing.Tuple[typing.Dict[typing.Tuple[str, str], datetime],
+                                                    typing.Dict[typing.Tuple[str, str], datetime]]:
+        # first seen and last synced times per (destination host, folder id), so lag survives restarts
+        with self.lock:
+            first_seen, last_synced = {}, {}
+            for host, destination in self.checkpoint.destinations.items():
+                first_seen.update({(host, folder_id): time for folder_id, time in destination.folders_first_seen.items()})
+                last_synced.update({(host, folder_id): time for folder_id, time in destination.folders_last_synced.items()})
+            return first_seen, last_synced
+
+    def set_folder_sync_times(self,
+                              first_seen: typing.Dict[typing.Tuple[str, str], datetime],
+                              last_synced: typing.Dict[typing.Tuple[str, str], datetime]) -> None:
+        with self.lock:
+            for destination in self.checkpoint.destinations.values():
+                destination.folders_first_seen = {}
+                destination.folders_last_synced = {}
+            for (host, folder_id), time in first_seen.items():
+                self._get_destination(host).folders_first_seen[folder_id] = time
+            for (host, folder_id), time in last_synced.items():
+                self._get_destination(host).folders_last_synced[folder_id] = time
+        self.save()
+
+    def save(self) -> None:
+        # a checkpoint that cannot be written only costs a cheap restart, it never stops the reconcile
+        if self.path is None:
+            return
+        with self.lock:
+            data = backup_sync_schema.CheckpointSchema().dump(self.checkpoint)
+            try:
+                # write then rename so a kill mid-write never leaves a truncated checkpoint
+                temp_path = f'{self.path}.tmp'
+                with open(temp_path, 'w') as f:
+                    json.dump(data, f)
+                os.replace(temp_path, self.path)
+                self.save_failed = False
+            except OSError as e:
+                if not self.save_failed:
+                    print('Error', f'cannot write checkpoint {self.path}')
+                    print(e)
+                self.save_failed = True
+
+    def _is_interrupted(self) -> bool:
+        return self.checkpoint.cycle_started is not None and (
+            self.checkpoint.cycle_completed is None or self.checkpoint.cycle_started > self.checkpoint.cycle_completed)
+
+    @staticmethod
+    def now() -> datetime:
+        return datetime.now(timezone.utc)
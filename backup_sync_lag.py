@@ -0,0 +1,196 @@
+from datetime import datetime
+import queue
+import threading
+import typing
+
+import backup_sync_checkpoint
+import backup_sync_model
+import backup_sync_schema
+import backup_sync_status
+import resilio_api
+import resilio_model
+
+
+class BackupLagReporter:
+    # polls destinations on its own cadence, one getstatuses request per host per pass
+    def __init__(self,
+                 *,
+                 config: backup_sync_model.BackupSyncConfig,
+                 status: backup_sync_status.BackupSyncStatus,
+                 interval: float = 300,
+                 stale_after: float = 3600,
+                 max_workers: int = 4,
+                 transport_factory: typing.Optional[typing.Callable] = None,
+                 checkpoint: typing.Optional[backup_sync_checkpoint.BackupSyncCheckpoint] = None) -> None:
+        self.config = config
+        self.transport_factory = transport_factory
+        self.checkpoint = checkpoint if checkpoint is not None else backup_sync_checkpoint.BackupSyncCheckpoint()
+        self.status = status
+        self.interval = interval
+        self.stale_after = stale_after
+        self.max_workers = max_workers
+
+        self.lock = threading.Lock()
+        self.apis: typing.Dict[str, resilio_api.ResilioSyncAPI] = {}
+        # restored from the checkpoint so a restart does not reset every folder to zero lag
+        self.first_seen, self.last_synced = self.checkpoint.get_folder_sync_times()
+        self.report: typing.Dict[str, backup_sync_model.DestinationLag] = {}
+
+        self.stop_event = threading.Event()
+        self.poll_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def request_poll(self) -> None:
+        self.poll_event.set()
+
+    def stop(self, timeout: typing.Optional[float] = None) -> None:
+        self.stop_event.set()
+        self.poll_event.set()
+        if self.thread.is_alive():
+            self.thread.join(timeout)
+
+    def run(self) -> None:
+        # passes run every interval, or earlier when requested, e.g. once the first reconcile has populated the snapshot
+        while not self.stop_event.is_set():
+            self.poll_event.wait(self.interval)
+            self.poll_event.clear()
+            if self.stop_event.is_set():
+                break
+            try:
+                self.poll()
+            except Exception as e:
+                print('Error', 'backup lag poll failed')
+                print(e)
+
+    def poll(self) -> typing.Sequence[backup_sync_model.DestinationLag]:
+        connection_infos = list({service.destination.connection_info.host: service.destination.connection_info
+                                 for service in self.config.services}.values())
+        # daemon workers rather than an executor, whose threads are joined at exit, so a host that hangs never
+        # holds up shutdown
+        pending = queue.Queue()
+        for index, connection_info in enumerate(connection_infos):
+            pending.put((index, connection_info))
+        results = [None] * len(connection_infos)
+
+        def work() -> None:
+            while True:
+                try:
+                    index, connection_info = pending.get_nowait()
+                except queue.Empty:
+                    return
+                results[index] = self._poll_destination(connection_info)
+
+        workers = [threading.Thread(target=work, daemon=True) for _ in range(min(self.max_workers, len(connection_infos)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        report = self._aggregate(results, backup_sync_status.BackupSyncStatus.now())
+        with self.lock:
+            self.report = {lag.host: lag for lag in report}
+        self.checkpoint.set_folder_sync_times(self.first_seen, self.last_synced)
+        for lag in report:
+            if lag.folders_stale > 0:
+                print('Stale', lag.host, [folder.name or folder.folder_id for folder in lag.folders if folder.stale])
+        return report
+
+    def _poll_destination(self, connection_info: resilio_model.ConnectionInfo) -> typing.Tuple[
+            str, typing.Optional[typing.Sequence[resilio_model.FolderSyncStatus]], typing.Optional[str]]:
+        try:
+            if connection_info.host not in self.apis:
+                transport = self.transport_factory(connection_info) if self.transport_factory is not None else None
+                self.apis[connection_info.host] = resilio_api.ResilioSyncAPI(connection_info=connection_info, transport=transport)
+            return connection_info.host, self.apis[connection_info.host].get_folder_sync_statuses(), None
+        except Exception as e:
+            # drop the client so the next pass starts with a fresh session and token
+            self.apis.pop(connection_info.host, None)
+            return connection_info.host, None, str(e)
+
+    def _aggregate(self,
+                   results: typing.Sequence[typing.Tuple[
+                       str, typing.Optional[typing.Sequence[resilio_model.FolderSyncStatus]], typing.Optional[str]]],
+                   now: datetime) -> typing.Sequence[backup_sync_model.DestinationLag]:
+        snapshot = {destination.host: destination for destination in self.status.get_destinations()}
+
+        # flatten every mapped folder of every destination into one set of columns
+        hosts, folder_ids, names, source_hosts, remains, errors = [], [], [], [], [], []
+        expected = {}
+        for host, statuses, _ in results:
+            statuses_by_id = {status.folder_id: status for status in statuses or []}
+            expected[host] = 0
+            destination = snapshot.get(host)
+            for source in (destination.sources.values() if destination is not None else []):
+                expected[host] += len(source.folders_mapped) + len(source.folders_missing)
+                for folder_id, name in source.folder_ids.items():
+                    folder_status = statuses_by_id.get(folder_id)
+                    hosts.append(host)
+                    folder_ids.append(folder_id)
+                    names.append(name)
+                    source_hosts.append(source.host)
+                    remains.append(folder_status.remain if folder_status is not None else None)
+                    errors.append(folder_status.error if folder_status is not None else None)
+
+        # forget folders no longer mapped so the history does not grow without bound; destinations without a
+        # snapshot yet, e.g. right after a restart, keep their history
+        mapped = set(zip(hosts, folder_ids))
+        self.first_seen = {key: value for key, value in self.first_seen.items() if key in mapped or key[0] not in snapshot}
+        self.last_synced = {key: value for key, value in self.last_synced.items() if key in mapped or key[0] not in snapshot}
+
+        # single pass over the columns computes lag and folds it into per destination totals
+        folders = {host: [] for host, _, _ in results}
+        totals = {host: {'synced': 0, 'stale': 0, 'lag_sum': 0.0, 'lag_max': None, 'remaining': 0}
+                  for host, _, _ in results}
+        polled = {host for host, statuses, _ in results if statuses is not None}
+        for host, folder_id, name, source_host, remain, error in zip(hosts, folder_ids, names, source_hosts, remains, errors):
+            key = (host, folder_id)
+            self.first_seen.setdefault(key, now)
+            synced = host in polled and remain == 0 and not error
+            if synced:
+                self.last_synced[key] = now
+            lag = (now - self.last_synced.get(key, self.first_seen[key])).total_seconds()
+            stale = lag > self.stale_after
+
+            total = totals[host]
+            total['synced'] += 1 if synced else 0
+            total['stale'] += 1 if stale else 0
+            total['lag_sum'] += lag
+            total['lag_max'] = lag if total['lag_max'] is None else max(total['lag_max'], lag)
+            total['remaining'] += remain or 0
+            folders[host].append(backup_sync_model.FolderLag(folder_id=folder_id,
+                                                             name=name,
+                                                             source_host=source_host,
+                                                             remaining_bytes=remain,
+                                                             last_synced=self.last_synced.get(key),
+                                                             lag_seconds=round(lag, 3),
+                                                             stale=stale,
+                                                             error=error))
+
+        report = []
+        for host, _, error in results:
+            total = totals[host]
+            count = len(folders[host])
+            report.append(backup_sync_model.DestinationLag(
+                host=host,
+                folders=folders[host],
+                folders_expected=expected[host],
+                folders_synced=total['synced'],
+                folders_stale=total['stale'],
+                coverage=round(total['synced'] / expected[host], 4) if expected[host] else None,
+                max_lag_seconds=round(total['lag_max'], 3) if total['lag_max'] is not None else None,
+                mean_lag_seconds=round(total['lag_sum'] / count, 3) if count else None,
+                remaining_bytes=total['remaining'],
+                polled=now,
+                error=error))
+        return report
+
+    def to_json(self) -> typing.Dict[str, typing.Any]:
+        with self.lock:
+            report = list(self.report.values())
+        return {
+            'staleAfterSeconds': self.stale_after,
+            'destinations': backup_sync_schema.DestinationLagSchema(many=True).dump(report),
+        }
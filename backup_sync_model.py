@@ -1,3 +1,4 @@
+from datetime import datetime
 from enum import Enum
 import typing
 
@@ -44,3 +45,113 @@ class DestinationServiceConfig():
 class BackupSyncConfig():
     def __init__(self, *, services: DestinationServiceConfig):
         self.services = services
+
+
+class SourceStatus:
+    def __init__(self,
+                 *,
+                 host: str,
+                 username: typing.Optional[str] = None,
+                 folders_mapped: typing.Sequence[str] = [],
+                 folder_ids: typing.Dict[str, str] = {},
+                 folders_missing: typing.Sequence[str] = [],
+                 names_pending: typing.Sequence[str] = [],
+                 last_success: typing.Optional[datetime] = None,
+                 last_error: typing.Optional[str] = None,
+                 last_error_time: typing.Optional[datetime] = None) -> None:
+        self.host = host
+        self.username = username
+        self.folders_mapped = folders_mapped
+        self.folder_ids = folder_ids
+        self.folders_missing = folders_missing
+        self.names_pending = names_pending
+        self.last_success = last_success
+        self.last_error = last_error
+        self.last_error_time = last_error_time
+
+
+class DestinationStatus:
+    def __init__(self,
+                 *,
+                 host: str,
+                 sources: typing.Dict[str, SourceStatus] = {},
+                 last_success: typing.Optional[datetime] = None,
+                 last_error: typing.Optional[str] = None,
+                 last_error_time: typing.Optional[datetime] = None) -> None:
+        self.host = host
+        self.sources = sources
+        self.last_success = last_success
+        self.last_error = last_error
+        self.last_error_time = last_error_time
+
+
+class FolderLag:
+    def __init__(self,
+                 *,
+                 folder_id: str,
+                 name: typing.Optional[str] = None,
+                 source_host: typing.Optional[str] = None,
+                 remaining_bytes: typing.Optional[int] = None,
+                 last_synced: typing.Optional[datetime] = None,
+                 lag_seconds: typing.Optional[float] = None,
+                 stale: bool = False,
+                 error: typing.Optional[str] = None) -> None:
+        self.folder_id = folder_id
+        self.name = name
+        self.source_host = source_host
+        self.remaining_bytes = remaining_bytes
+        self.last_synced = last_synced
+        self.lag_seconds = lag_seconds
+        self.stale = stale
+        self.error = error
+
+
+class DestinationLag:
+    def __init__(self,
+                 *,
+                 host: str,
+                 folders: typing.Sequence[FolderLag] = [],
+                 folders_expected: int = 0,
+                 folders_synced: int = 0,
+                 folders_stale: int = 0,
+                 coverage: typing.Optional[float] = None,
+                 max_lag_seconds: typing.Optional[float] = None,
+                 mean_lag_seconds: typing.Optional[float] = None,
+                 remaining_bytes: int = 0,
+                 polled: typing.Optional[datetime] = None,
+                 error: typing.Optional[str] = None) -> None:
+        self.host = host
+        self.folders = folders
+        self.folders_expected = folders_expected
+        self.folders_synced = folders_synced
+        self.folders_stale = folders_stale
+        self.coverage = coverage
+        self.max_lag_seconds = max_lag_seconds
+        self.mean_lag_seconds = mean_lag_seconds
+        self.remaining_bytes = remaining_bytes
+        self.polled = polled
+        self.error = error
+
+
+class DestinationCheckpoint:
+    def __init__(self,
+                 *,
+                 pending_names: typing.Dict[str, str] = {},
+                 sources_completed: typing.Dict[str, datetime] = {},
+                 folders_first_seen: typing.Dict[str, datetime] = {},
+                 folders_last_synced: typing.Dict[str, datetime] = {}) -> None:
+        self.pending_names = pending_names
+        self.sources_completed = sources_completed
+        self.folders_first_seen = folders_first_seen
+        self.folders_last_synced = folders_last_synced
+
+
+class Checkpoint:
+    def __init__(self,
+                 *,
+                 destinations: typing.Dict[str, DestinationCheckpoint] = {},
+                 cycle_started: typing.Optional[datetime] = None,
+                 cycle_completed: typing.Optional[datetime] = None) -> None:
+        self.destinations = destinations
+        self.cycle_started = cycle_started
+        self.cycle_completed = cycle_completed
@@ -56,3 +56,85 @@ class BackupSyncConfigSchema(Schema):
     @post_load
     def make_object(self, data, **kwargs):
         return backup_sync_model.BackupSyncConfig(**data)
+
+
+class SourceStatusSchema(Schema):
+    host = fields.Str()
+    username = fields.Str(allow_none=True)
+    folders_mapped = fields.List(fields.Str(), data_key='foldersMapped')
+    folder_ids = fields.Dict(keys=fields.Str(), values=fields.Str(), data_key='folderIds')
+    folders_missing = fields.List(fields.Str(), data_key='foldersMissing')
+    names_pending = fields.List(fields.Str(), data_key='namesPending')
+    last_success = fields.DateTime(data_key='lastSuccess', allow_none=True)
+    last_error = fields.Str(data_key='lastError', allow_none=True)
+    last_error_time = fields.DateTime(data_key='lastErrorTime', allow_none=True)
+
+    @post_load
+    def make_object(self, data, **kwargs):
+        return backup_sync_model.SourceStatus(**data)
+
+
+class DestinationStatusSchema(Schema):
+    host = fields.Str()
+    sources = fields.Dict(keys=fields.Str(), values=fields.Nested(SourceStatusSchema))
+    last_success = fields.DateTime(data_key='lastSuccess', allow_none=True)
+    last_error = fields.Str(data_key='lastError', allow_none=True)
+    last_error_time = fields.DateTime(data_key='lastErrorTime', allow_none=True)
+
+    @post_load
+    def make_object(self, data, **kwargs):
+        return backup_sync_model.DestinationStatus(**data)
+
+
+class FolderLagSchema(Schema):
+    folder_id = fields.Str(data_key='folderId')
+    name = fields.Str(allow_none=True)
+    source_host = fields.Str(data_key='sourceHost', allow_none=True)
+    remaining_bytes = fields.Int(data_key='remainingBytes', allow_none=True)
+    last_synced = fields.DateTime(data_key='lastSynced', allow_none=True)
+    lag_seconds = fields.Float(data_key='lagSeconds', allow_none=True)
+    stale = fields.Bool()
+    error = fields.Str(allow_none=True)
+
+    @post_load
+    def make_object(self, data, **kwargs):
+        return backup_sync_model.FolderLag(**data)
+
+
+class DestinationLagSchema(Schema):
+    host = fields.Str()
+    folders = fields.List(fields.Nested(FolderLagSchema))
+    folders_expected = fields.Int(data_key='foldersExpected')
+    folders_synced = fields.Int(data_key='foldersSynced')
+    folders_stale = fields.Int(data_key='foldersStale')
+    coverage = fields.Float(allow_none=True)
+    max_lag_seconds = fields.Float(data_key='maxLagSeconds', allow_none=True)
+    mean_lag_seconds = fields.Float(data_key='meanLagSeconds', allow_none=True)
+    remaining_bytes = fields.Int(data_key='remainingBytes')
+    polled = fields.DateTime(allow_none=True)
+    error = fields.Str(allow_none=True)
+
+    @post_load
+    def make_object(self, data, **kwargs):
+        return backup_sync_model.DestinationLag(**data)
+
+
+class DestinationCheckpointSchema(Schema):
+    pending_names = fields.Dict(keys=fields.Str(), values=fields.Str(), data_key='pendingNames')
+    sources_completed = fields.Dict(keys=fields.Str(), values=fields.DateTime(), data_key='sourcesCompleted')
+    folders_first_seen = fields.Dict(keys=fields.Str(), values=fields.DateTime(), data_key='foldersFirstSeen', missing=dict)
+    folders_last_synced = fields.Dict(keys=fields.Str(), values=fields.DateTime(), data_key='foldersLastSynced', missing=dict)
+
+    @post_load
+    def make_object(self, data, **kwargs):
+        return backup_sync_model.DestinationCheckpoint(**data)
+
+
+class CheckpointSchema(Schema):
+    destinations = fields.Dict(keys=fields.Str(), values=fields.Nested(DestinationCheckpointSchema))
+    cycle_started = fields.DateTime(data_key='cycleStarted', allow_none=True)
+    cycle_completed = fields.DateTime(data_key='cycleCompleted', allow_none=True)
+
+    @post_load
+    def make_object(self, data, **kwargs):
+        return backup_sync_model.Checkpoint(**data)
@@ -3,38 +3,100 @@ from enum import Enum
 import json
 import os
 import signal
-import time
+import threading
+import typing
 
 from marshmallow import Schema, fields, post_load
 
+import backup_sync_checkpoint
+import backup_sync_lag
 import backup_sync_model
 import backup_sync_schema
+import backup_sync_status
 import resilio_api
+import resilio_model
+import resilio_rate_limit
+import resilio_transport
 
 
 class BackupDestinationService:
-    def __init__(self, *, config: backup_sync_model.DestinationServiceConfig) -> None:
+    def __init__(self,
+                 *,
+                 config: backup_sync_model.DestinationServiceConfig,
+                 status: typing.Optional[backup_sync_status.BackupSyncStatus] = None,
+                 transport_factory: typing.Optional[typing.Callable] = None,
+                 checkpoint: typing.Optional[backup_sync_checkpoint.BackupSyncCheckpoint] = None,
+                 shutdown: typing.Optional[threading.Event] = None) -> None:
         self.config = config
+        self.status = status if status is not None else backup_sync_status.BackupSyncStatus()
+        self.checkpoint = checkpoint if checkpoint is not None else backup_sync_checkpoint.BackupSyncCheckpoint()
+        self.shutdown = shutdown if shutdown is not None else threading.Event()
 
-        self.destination_api = resilio_api.ResilioSyncAPI(connection_info=config.destination.connection_info)
-        self.source_apis = [resilio_api.ResilioSyncAPI(connection_info=source.connection_info) for source in config.sources]
+        self.destination_api = BackupDestinationService._create_api(config.destination.connection_info, transport_factory)
+        self.source_apis = [BackupDestinationService._create_api(source.connection_info, transport_factory) for source in config.sources]
 
-    def update_sources(self) -> None:
+    def update_sources(self) -> bool:
+        self.flush_pending_names()
         for source_config, source_api in zip(self.config.sources, self.source_apis):
-            self.update_source(source_config, source_api)
+            if self.shutdown.is_set():
+                return False
+            if self.checkpoint.is_source_completed(self.destination_api.host, source_api.host):
+                continue
+            try:
+                completed = self.update_source(source_config, source_api)
+            except Exception as e:
+                self.status.set_source_error(self.destination_api.host, source_api.host, e)
+                raise
+            if completed:
+                self.checkpoint.complete_source(self.destination_api.host, source_api.host)
+            elif self.shutdown.is_set():
+                return False
+        return True
+
+    def flush_pending_names(self) -> None:
+        # names checkpointed by an interrupted run are written before any discovery
+        pending_names = self.checkpoint.get_pending_names(self.destination_api.host)
+        if not pending_names:
+            return
+        dest_local_storage = self.destination_api.get_local_storage()
+        if dest_local_storage is None:
+            return
+        dest_local_storage.custom_folder_names.update(pending_names)
+        if dest_local_storage_change:
+            self.destination_api.set_local_storage(dest_local_storage)
+            self.checkpoint.clear_pending_names(self.destination_api.host, pending_names)
     
-    def update_source(self, source_config: backup_sync_model.BackupSource, source_api: resilio_api.ResilioSyncAPI) -> None:
+    def update_source(self, source_config: backup_sync_model.BackupSource, source_api: resilio_api.ResilioSyncAPI) -> bool:
+        # every read can take a full request timeout, so a shutdown is honoured between them and nothing is written
         dest_folder_secrets_to_ids = BackupDestinationService._map_folder_secrets_to_folder_ids(self.destination_api)
+        if self.shutdown.is_set():
+            return False
 
         dest_local_storage = self.destination_api.get_local_storage()
         if dest_local_storage is None:
             print('Error', f'cannot access local storage for {self.destination_api.host}')
-            return
+            self.status.set_source_error(self.destination_api.host, source_api.host,
+                                         RuntimeError(f'cannot access local storage for {self.destination_api.host}'))
+            return False
+        if self.shutdown.is_set():
+            return False
         dest_local_storage_change = False
+        pending_names = {}
+        completed = True
 
         source_username = source_api.get_user_identity().username
+        if self.shutdown.is_set():
+            return False
+        source_status = backup_sync_model.SourceStatus(host=source_api.host, username=source_username,
+                                                       folders_mapped=[], folder_ids={}, folders_missing=[], names_pending=[])
         source_folders = source_api.get_sync_folders()
+        if self.shutdown.is_set():
+            return False
         for folder in source_folders:
+            if self.shutdown.is_set():
+                # stop adding folders, but still write the names of those already added
+                completed = False
+                break
             if folder.is_owner:
                 sync_type = source_config.sync_type
                 if folder.name in source_config.folders and source_config.folders[folder.name].sync_type:
@@ -69,6 +131,16 @@ class BackupDestinationService:
                         except Exception as e:
                             print('Error', new_folder_name, secret[0:4])
                             print(e)
+                            source_status.last_error = str(e)
+                            source_status.last_error_time = backup_sync_status.BackupSyncStatus.now()
+                        else:
+                            self.checkpoint.add_pending_names(self.destination_api.host, {resp.folder_id: new_folder_name})
+
+                    if secret in dest_folder_secrets_to_ids:
+                        source_status.folders_mapped.append(new_folder_name)
+                        source_status.folder_ids[dest_folder_secrets_to_ids[secret]] = new_folder_name
+                    else:
+                        source_status.folders_missing.append(new_folder_name)
 
                     if secret in dest_folder_secrets_to_ids and (
                             dest_folder_secrets_to_ids[secret] not in dest_local_storage.custom_folder_names or
@@ -76,8 +148,23 @@ class BackupDestinationService:
                         ):
                         dest_local_storage.custom_folder_names[dest_folder_secrets_to_ids[secret]] = new_folder_name
                         dest_local_storage_change = True
+                        source_status.names_pending.append(new_folder_name)
+                        pending_names[dest_folder_secrets_to_ids[secret]] = new_folder_name
 
-        self.destination_api.set_local_storage(dest_local_storage)
+        # publish the pending names before the write so a failure leaves them visible
+        self.status.set_source(self.destination_api.host, source_status)
+        self.checkpoint.add_pending_names(self.destination_api.host, pending_names)
+        if dest_local_storage_change:
+            self.destination_api.set_local_storage(dest_local_storage)
+            self.checkpoint.clear_pending_names(self.destination_api.host, pending_names)
+        self.status.set_source_names_written(self.destination_api.host, source_api.host,
+                                             completed and not source_status.folders_missing)
+        return completed
+
+    @staticmethod
+    def _create_api(connection_info: resilio_model.ConnectionInfo, transport_factory: typing.Optional[typing.Callable]) -> resilio_api.ResilioSyncAPI:
+        transport = transport_factory(connection_info) if transport_factory is not None else None
+        return resilio_api.ResilioSyncAPI(connection_info=connection_info, transport=transport)
 
     @staticmethod
     def _map_folder_secrets_to_folder_ids(api_client: resilio_api.ResilioSyncAPI):
@@ -89,48 +176,160 @@ class BackupDestinationService:
 
 
 class BackupSyncService:
-    def __init__(self, *, config: backup_sync_model.BackupSyncConfig) -> None:
+    def __init__(self,
+                 *,
+                 config: backup_sync_model.BackupSyncConfig,
+                 status: typing.Optional[backup_sync_status.BackupSyncStatus] = None,
+                 transport_factory: typing.Optional[typing.Callable] = None,
+                 checkpoint: typing.Optional[backup_sync_checkpoint.BackupSyncCheckpoint] = None,
+                 shutdown: typing.Optional[threading.Event] = None) -> None:
         self.config = config
+        self.status = status if status is not None else backup_sync_status.BackupSyncStatus()
+        self.transport_factory = transport_factory
+        self.checkpoint = checkpoint if checkpoint is not None else backup_sync_checkpoint.BackupSyncCheckpoint()
+        self.shutdown = shutdown if shutdown is not None else threading.Event()
         self.pending_service_configs = config.services
         self.services = []
 
     def _init_services(self) -> None:
         pending_service_configs = []
         for service_config in self.pending_service_configs:
+            if self.shutdown.is_set():
+                pending_service_configs.append(service_config)
+                continue
             try:
-                service = BackupDestinationService(config=service_config)
+                service = BackupDestinationService(config=service_config,
+                                                   status=self.status,
+                                                   transport_factory=self.transport_factory,
+                                                   checkpoint=self.checkpoint,
+                                                   shutdown=self.shutdown)
                 self.services.append(service)
             except Exception as e:
                 print('Error', f'could not init {service_config.destination.connection_info.host}')
                 print(e)
+                self.status.set_destination_error(service_config.destination.connection_info.host, e)
                 pending_service_configs.append(service_config)
         self.pending_service_configs = pending_service_configs
 
 
     def update_destinations(self) -> None:
+        self.checkpoint.start_cycle()
         self._init_services()
+        interrupted = False
         for service in self.services:
+            if self.shutdown.is_set():
+                interrupted = True
+                break
             try:
-                service.update_sources()
-                print(f'updated {service.config.destination.connection_info.host}')
+                if service.update_sources():
+                    print(f'updated {service.config.destination.connection_info.host}')
+                    self.status.set_destination_success(service.config.destination.connection_info.host)
+                elif self.shutdown.is_set():
+                    interrupted = True
+                    break
             except Exception as e:
                 print(e)
+                self.status.set_destination_error(service.config.destination.connection_info.host, e)
+
+        if not interrupted:
+            self.checkpoint.complete_cycle()
+
+        for host, stats in resilio_rate_limit.get_wait_stats().items():
+            if stats['waits'] > 0:
+                print('Rate limit', host, stats)
 
 
-def signal_handler(signal, frame):
-    print('\nterminating...')
-    exit(0)
+class GracefulShutdown:
+    # the first signal lets the current request finish and the cycle wind down, a second one or the timeout forces exit
+    def __init__(self, *, timeout: float = 30) -> None:
+        self.timeout = timeout
+        self.event = threading.Event()
+
+    def __call__(self, signum, frame):
+        if self.event.is_set():
+            GracefulShutdown._force_exit()
+        print('\nterminating...')
+        self.event.set()
+        resilio_rate_limit.cancel_waits()
+        timer = threading.Timer(self.timeout, GracefulShutdown._force_exit)
+        timer.daemon = True
+        timer.start()
+
+    @staticmethod
+    def _force_exit():
+        print('\nforce terminating...')
+        os._exit(1)
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Sync folders from one user to another')
     parser.add_argument('config', type=str)
+    parser.add_argument('--status-host', type=str, default='127.0.0.1', help='address for the JSON status endpoint')
+    parser.add_argument('--status-port', type=int, default=None, help='serve the last cycle snapshot on this port')
+    parser.add_argument('--lag-interval', type=float, default=300, help='seconds between backup lag polls, 0 to disable')
+    parser.add_argument('--stale-after', type=float, default=3600, help='seconds of lag before a backup is flagged stale')
+    transport_group = parser.add_mutually_exclusive_group()
+    transport_group.add_argument('--record', type=str, default=None, metavar='DIR', help='record redacted API traffic to cassettes in DIR')
+    transport_group.add_argument('--replay', type=str, default=None, metavar='DIR', help='serve API traffic from cassettes in DIR')
+    parser.add_argument('--replay-speedup', type=float, default=1.0, help='replay recorded latencies this many times faster, 0 for no delay')
+    parser.add_argument('--checkpoint', type=str, default=None, help='file to persist cycle progress and pending folder names')
+    parser.add_argument('--shutdown-timeout', type=float, default=30, help='seconds to wind down after SIGINT or SIGTERM before forcing exit')
     args = parser.parse_args()
 
-    signal.signal(signal.SIGINT, signal_handler)
+    # requests keep their usual timeout, a request still running when the shutdown window ends is cut by the forced
+    # exit and the checkpoint written after every step lets the restart pick up from there
+    transport_factory = resilio_transport.RequestsTransportFactory()
+    interval = 30
+    if args.record is not None:
+        transport_factory = resilio_transport.CassetteTransportFactory(directory=args.record, mode=resilio_transport.CassetteTransportFactory.RECORD)
+    elif args.replay is not None:
+        transport_factory = resilio_transport.CassetteTransportFactory(directory=args.replay, mode=resilio_transport.CassetteTransportFactory.REPLAY,
+                                                                       speedup=args.replay_speedup)
+        interval = 30 / args.replay_speedup if args.replay_speedup > 0 else 0
+
+    shutdown = GracefulShutdown(timeout=args.shutdown_timeout)
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    checkpoint = backup_sync_checkpoint.BackupSyncCheckpoint(path=args.checkpoint)
 
     with open(args.config, 'r') as f:
         config = backup_sync_schema.BackupSyncConfigSchema().load(json.load(f))
-        while True:
-            service = BackupSyncService(config=config)
-            service.update_destinations()
-            time.sleep(30)
+
+        status = backup_sync_status.BackupSyncStatus()
+        lag_reporter = None
+        if args.lag_interval > 0:
+            lag_reporter = backup_sync_lag.BackupLagReporter(config=config, status=status,
+                                                            interval=args.lag_interval, stale_after=args.stale_after,
+                                                            transport_factory=transport_factory, checkpoint=checkpoint)
+            lag_reporter.start()
+
+        status_server = None
+        if args.status_port is not None:
+            status_server = backup_sync_status.BackupSyncStatusServer(status=status, host=args.status_host, port=args.status_port)
+            if lag_reporter is not None:
+                status_server.add_route('/lag', lag_reporter.to_json)
+            status_server.start()
+
+        try:
+            shutdown.event.wait(checkpoint.get_remaining_wait(interval))
+            while not shutdown.event.is_set():
+                service = BackupSyncService(config=config,
+                                            status=status,
+                                            transport_factory=transport_factory,
+                                            checkpoint=checkpoint,
+                                            shutdown=shutdown.event)
+                service.update_destinations()
+                if lag_reporter is not None and lag_reporter.report == {}:
+                    # first lag report right after the first reconcile instead of one lag interval later
+                    lag_reporter.request_poll()
+                shutdown.event.wait(interval)
+        finally:
+            if lag_reporter is not None:
+                # a poll still waiting on a host is left to the forced exit, it only holds lag figures
+                lag_reporter.stop(timeout=1)
+            if status_server is not None:
+                status_server.stop()
+            checkpoint.save()
+            if isinstance(transport_factory, resilio_transport.CassetteTransportFactory):
+                transport_factory.close()
+            print('terminated')
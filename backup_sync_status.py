@@ -0,0 +1,140 @@
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import typing
+
+import backup_sync_model
+import backup_sync_schema
+import resilio_rate_limit
+
+
+class BackupSyncStatus:
+    # snapshot of the last cycle, read by the status endpoint without touching any host
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.destinations: typing.Dict[str, backup_sync_model.DestinationStatus] = {}
+
+    def _get_destination(self, host: str) -> backup_sync_model.DestinationStatus:
+        if host not in self.destinations:
+            self.destinations[host] = backup_sync_model.DestinationStatus(host=host, sources={})
+        return self.destinations[host]
+
+    def set_source(self, destination_host: str, source_status: backup_sync_model.SourceStatus) -> None:
+        source_status = BackupSyncStatus._copy_source(source_status)
+        with self.lock:
+            destination = self._get_destination(destination_host)
+            previous = destination.sources.get(source_status.host)
+            if previous is not None and source_status.last_success is None:
+                source_status.last_success = previous.last_success
+            if previous is not None and source_status.last_error is None:
+                source_status.last_error = previous.last_error
+                source_status.last_error_time = previous.last_error_time
+            destination.sources[source_status.host] = source_status
+
+    def set_source_names_written(self, destination_host: str, source_host: str, succeeded: bool) -> None:
+        # the reconcile loop finishes a published source status here, never by mutating it directly
+        with self.lock:
+            source = self._get_destination(destination_host).sources.get(source_host)
+            if source is None:
+                return
+            source.names_pending = []
+            if succeeded:
+                source.last_success = BackupSyncStatus.now()
+
+    def set_source_error(self, destination_host: str, source_host: str, error: Exception) -> None:
+        with self.lock:
+            destination = self._get_destination(destination_host)
+            if source_host not in destination.sources:
+                destination.sources[source_host] = backup_sync_model.SourceStatus(host=source_host)
+            destination.sources[source_host].last_error = str(error)
+            destination.sources[source_host].last_error_time = BackupSyncStatus.now()
+
+    def set_destination_success(self, destination_host: str) -> None:
+        with self.lock:
+            self._get_destination(destination_host).last_success = BackupSyncStatus.now()
+
+    def set_destination_error(self, destination_host: str, error: Exception) -> None:
+        with self.lock:
+            destination = self._get_destination(destination_host)
+            destination.last_error = str(error)
+            destination.last_error_time = BackupSyncStatus.now()
+
+    def get_destinations(self) -> typing.Sequence[backup_sync_model.DestinationStatus]:
+        # copies taken under the lock, so readers on other threads never see the reconcile loop mutate them
+        with self.lock:
+            return [BackupSyncStatus._copy_destination(destination) for destination in self.destinations.values()]
+
+    @staticmethod
+    def _copy_source(source: backup_sync_model.SourceStatus) -> backup_sync_model.SourceStatus:
+        return backup_sync_model.SourceStatus(host=source.host,
+                                              username=source.username,
+                                              folders_mapped=list(source.folders_mapped),
+                                              folder_ids=dict(source.folder_ids),
+                                              folders_missing=list(source.folders_missing),
+                                              names_pending=list(source.names_pending),
+                                              last_success=source.last_success,
+                                              last_error=source.last_error,
+                                              last_error_time=source.last_error_time)
+
+    @staticmethod
+    def _copy_destination(destination: backup_sync_model.DestinationStatus) -> backup_sync_model.DestinationStatus:
+        return backup_sync_model.DestinationStatus(host=destination.host,
+                                                   sources={host: BackupSyncStatus._copy_source(source)
+                                                            for host, source in destination.sources.items()},
+                                                   last_success=destination.last_success,
+                                                   last_error=destination.last_error,
+                                                   last_error_time=destination.last_error_time)
+
+    def to_json(self) -> typing.Dict[str, typing.Any]:
+        return {
+            'destinations': backup_sync_schema.DestinationStatusSchema(many=True).dump(self.get_destinations()),
+            'rateLimits': resilio_rate_limit.get_wait_stats(),
+        }
+
+    @staticmethod
+    def now() -> datetime:
+        return datetime.now(timezone.utc)
+
+
+class BackupSyncStatusRequestHandler(BaseHTTPRequestHandler):
+    routes: typing.Dict[str, typing.Callable[[], typing.Dict[str, typing.Any]]] = {}
+
+    def do_GET(self):
+        route = self.routes.get(self.path.split('?')[0].rstrip('/') or '/')
+        if route is None:
+            self._send_json(404, {'error': f'unknown path {self.path}'})
+            return
+        self._send_json(200, route())
+
+    def _send_json(self, code: int, data: typing.Dict[str, typing.Any]) -> None:
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BackupSyncStatusServer:
+    def __init__(self, *, status: BackupSyncStatus, host: str = '127.0.0.1', port: int = 8080) -> None:
+        routes = {
+            '/': status.to_json,
+            '/status': status.to_json,
+        }
+        handler = type('BoundStatusRequestHandler', (BackupSyncStatusRequestHandler,), {'routes': routes})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def add_route(self, path: str, route: typing.Callable[[], typing.Dict[str, typing.Any]]) -> None:
+        self.server.RequestHandlerClass.routes[path] = route
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -8,7 +8,9 @@ import urllib
 from marshmallow import Schema, fields, post_load
 
 import resilio_model
+import resilio_rate_limit
 import resilio_schema
+import resilio_transport
 
 
 class ResilioSyncAPITokenParser(HTMLParser):
@@ -21,19 +23,27 @@ class ResilioSyncAPITokenParser(HTMLParser):
 
 
 class ResilioSyncAPI:
-    def __init__(self, *, connection_info: resilio_model.ConnectionInfo):
+    def __init__(self, *, connection_info: resilio_model.ConnectionInfo, transport=None):
         self.host = connection_info.host
         self.auth = connection_info.auth
         
-        self.session = None
+        self.transport = transport
         self.token = None
         self.verify_ssl = connection_info.verify_ssl
+        self.rate_limiter = None
+        # replayed responses never reach the host, throttling them would only undo the replay speedup
+        if getattr(transport, 'rate_limited', True):
+            self.rate_limiter = resilio_rate_limit.get_host_rate_limiter(
+                host=connection_info.host,
+                max_requests_per_second=connection_info.max_requests_per_second,
+                max_bytes_per_second=connection_info.max_bytes_per_second)
 
         self.init_session()
         self.refresh_token()
 
     def init_session(self):
-        self.session = requests.Session()
+        if self.transport is None:
+            self.transport = resilio_transport.RequestsTransport()
         self.headers = {
             'Accept': 'application/json, text/javascript, */*; q=0.01',
             'Accept-Encoding': 'gzip, deflate',
@@ -44,7 +54,7 @@ class ResilioSyncAPI:
 
     def refresh_token(self):
         url = f'{self.host}/gui/token.html?t={ResilioSyncAPI._get_time_ms()}'
-        resp = self.session.get(url, headers=self.headers, verify=self.verify_ssl)
+        resp = self._get(url)
         resp.raise_for_status()
 
         parser = ResilioSyncAPITokenParser()
@@ -89,6 +99,19 @@ class ResilioSyncAPI:
     def get_history(self, *, start=0, length=1000, order=1):
         return self._get_basic_action('history', params={ 'start': start, 'length': length, 'order': order })
 
+    def iter_history(self, *, start: int = 0, page_size: int = 1000, order: int = 1) -> typing.Iterator[typing.Tuple[int, typing.Dict[str, typing.Any]]]:
+        # yields (cursor, entry) one page at a time; pass cursor + 1 as start to resume
+        if page_size < 1:
+            raise ValueError(f'page_size must be at least 1, got {page_size}')
+        cursor = start
+        while True:
+            page = ResilioSyncAPI._get_history_entries(self.get_history(start=cursor, length=page_size, order=order))
+            for entry in page:
+                yield cursor, entry
+                cursor += 1
+            if len(page) < page_size:
+                return
+
     def get_system_info(self):
         return self._get_basic_action('getsysteminfo')
 
@@ -101,6 +124,13 @@ class ResilioSyncAPI:
     def get_statuses(self):
         return self._get_basic_action('getstatuses')
 
+    def get_folder_sync_statuses(self) -> typing.Sequence[resilio_model.FolderSyncStatus]:
+        # one request covers every folder on the host
+        data = self.get_statuses()
+        if isinstance(data, list):
+            data = { 'folders': data }
+        return resilio_schema.FolderSyncStatusesSchema().load(data).folders
+
     def get_scheduler(self):
         return self._get_basic_action('getscheduler')
 
@@ -159,7 +189,7 @@ class ResilioSyncAPI:
         url = f'{self.host}/gui/?token={self.token}&action={action}&t={ResilioSyncAPI._get_time_ms()}'
         for key in params:
             url += f'&{key}={urllib.parse.quote(str(params[key]), safe="")}'
-        resp = self.session.get(url, headers=self.headers, verify=self.verify_ssl)
+        resp = self._get(url)
         resp.raise_for_status()
         data = resp.json()
         if 'status' in data:
@@ -170,6 +200,28 @@ class ResilioSyncAPI:
             return data['value']
         return data
 
+    def _get(self, url: str) -> requests.Response:
+        if self.rate_limiter is None:
+            return self.transport.get(url, headers=self.headers, verify=self.verify_ssl)
+        reserved = self.rate_limiter.acquire()
+        try:
+            resp = self.transport.get(url, headers=self.headers, verify=self.verify_ssl)
+        except Exception:
+            self.rate_limiter.consume_bytes(0, reserved)
+            raise
+        self.rate_limiter.consume_bytes(len(resp.content), reserved)
+        return resp
+
+    @staticmethod
+    def _get_history_entries(data) -> typing.List[typing.Dict[str, typing.Any]]:
+        if isinstance(data, list):
+            return data
+        for key in ('history', 'events'):
+            if isinstance(data, dict) and key in data:
+                return data[key]
+        # an empty page ends the export, so a shape we do not know must fail instead of looking like the end
+        raise ValueError(f'unrecognized history response: {str(data)[0:200]}')
+
     @staticmethod
     def _get_time_ms():
         return round(datetime.now().timestamp() * 1000)
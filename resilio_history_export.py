@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import typing
+
+import resilio_api
+import resilio_schema
+
+
+def get_cursor_path(output: str) -> str:
+    return f'{output}.cursor'
+
+
+def read_cursor(output: str) -> typing.Optional[typing.Dict[str, int]]:
+    cursor_path = get_cursor_path(output)
+    if not os.path.exists(cursor_path):
+        return None
+    with open(cursor_path, 'r') as f:
+        return json.load(f)
+
+
+def write_cursor(output: str, cursor: int, offset: int) -> None:
+    # write then rename so the sidecar is never left half written
+    cursor_path = get_cursor_path(output)
+    with open(f'{cursor_path}.tmp', 'w') as f:
+        json.dump({'cursor': cursor, 'offset': offset}, f)
+    os.replace(f'{cursor_path}.tmp', cursor_path)
+
+
+def export_history(api: resilio_api.ResilioSyncAPI, output: str, *, start: int = 0, page_size: int = 1000, order: int = 1) -> int:
+    # appends, recording the next history position and the output size after every page so an export can resume
+    cursor = start
+    with open(output, 'ab') as f:
+        for position, entry in api.iter_history(start=start, page_size=page_size, order=order):
+            f.write(json.dumps(entry).encode('utf-8'))
+            f.write(b'\n')
+            cursor = position + 1
+            if (cursor - start) % page_size == 0:
+                f.flush()
+                write_cursor(output, cursor, f.tell())
+        f.flush()
+        write_cursor(output, cursor, f.tell())
+    return cursor
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'must be at least 1, got {value}')
+    return number
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export transfer history of a Resilio Sync host as JSON Lines')
+    parser.add_argument('connection_info', type=str, help='connection info json file')
+    parser.add_argument('output', type=str, help='JSON Lines output file')
+    parser.add_argument('--page-size', type=positive_int, default=1000)
+    parser.add_argument('--order', type=int, default=1)
+    parser.add_argument('--start', type=int, default=0, help='history position to start from')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue from the cursor saved next to output, or from --start when output does not exist yet')
+    args = parser.parse_args()
+
+    with open(args.connection_info, 'r') as f:
+        connection_info = resilio_schema.ConnectionInfoSchema().load(json.load(f))
+
+    start = args.start
+    saved_cursor = read_cursor(args.output) if args.resume else None
+    if saved_cursor is not None:
+        # drop anything written after the last saved cursor so no entry is exported twice
+        start = saved_cursor['cursor']
+        with open(args.output, 'ab') as f:
+            f.truncate(saved_cursor['offset'])
+    elif args.resume and os.path.exists(args.output):
+        # without a cursor there is no telling where the existing output stops
+        parser.error(f'{args.output} exists but has no cursor file, remove it or run without --resume')
+    else:
+        open(args.output, 'w').close()
+        if os.path.exists(get_cursor_path(args.output)):
+            os.remove(get_cursor_path(args.output))
+
+    api = resilio_api.ResilioSyncAPI(connection_info=connection_info)
+    cursor = export_history(api, args.output, start=start, page_size=args.page_size, order=args.order)
+    print(f'exported {cursor - start} entries, next cursor {cursor}')
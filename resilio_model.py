@@ -47,11 +47,15 @@ class ConnectionInfo:
                  user: typing.Optional[str] = None,
                  password: typing.Optional[str] = None,
                  auth: typing.Optional[str] = None,
-                 verify_ssl: bool = True) -> None:
+                 verify_ssl: bool = True,
+                 max_requests_per_second: typing.Optional[float] = None,
+                 max_bytes_per_second: typing.Optional[float] = None) -> None:
         self.host = host
         self.user = user
         self.password = password
         self.verify_ssl = verify_ssl
+        self.max_requests_per_second = max_requests_per_second
+        self.max_bytes_per_second = max_bytes_per_second
 
         if self.user is not None and self.password is not None:
             user_password = f'{self.user}:{self.password}'
@@ -91,6 +95,24 @@ class Folders:
         self.folders = folders
 
 
+class FolderSyncStatus:
+    def __init__(self,
+                 *,
+                 folder_id: str,
+                 size: typing.Optional[int] = None,
+                 remain: typing.Optional[int] = None,
+                 error: typing.Optional[str] = None) -> None:
+        self.folder_id = folder_id
+        self.size = size
+        self.remain = remain
+        self.error = error
+
+
+class FolderSyncStatuses:
+    def __init__(self, *, folders: typing.Sequence[FolderSyncStatus] = []) -> None:
+        self.folders = folders
+
+
 class Identity:
     def __init__(self, *, device_name: str, id: str, username: str) -> None:
         self.device_name = device_name
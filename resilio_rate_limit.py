@@ -0,0 +1,143 @@
+import threading
+import time
+import typing
+
+
+class TokenBucket:
+    def __init__(self, *, rate: float, capacity: typing.Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        # tokens may go negative; the debt is the caller's position in the queue
+        self._refill(time.monotonic())
+        self.tokens -= amount
+        return max(0.0, -self.tokens / self.rate)
+
+    def refund(self, amount: float) -> None:
+        self._refill(time.monotonic())
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class HostRateLimiter:
+    def __init__(self,
+                 *,
+                 host: str,
+                 max_requests_per_second: typing.Optional[float] = None,
+                 max_bytes_per_second: typing.Optional[float] = None) -> None:
+        self.host = host
+        self.lock = threading.Lock()
+        self.request_bucket = TokenBucket(rate=max_requests_per_second) if max_requests_per_second else None
+        self.byte_bucket = TokenBucket(rate=max_bytes_per_second) if max_bytes_per_second else None
+
+        self.requests = 0
+        self.responses = 0
+        self.bytes = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.conflicts = set()
+
+    def restrict(self,
+                 *,
+                 max_requests_per_second: typing.Optional[float] = None,
+                 max_bytes_per_second: typing.Optional[float] = None) -> None:
+        # a host configured more than once keeps the strictest limit of each kind
+        with self.lock:
+            self.request_bucket = self._restrict_bucket('maxRequestsPerSecond', self.request_bucket, max_requests_per_second)
+            self.byte_bucket = self._restrict_bucket('maxBytesPerSecond', self.byte_bucket, max_bytes_per_second)
+
+    def _restrict_bucket(self, name: str, bucket: typing.Optional[TokenBucket], rate: typing.Optional[float]) -> typing.Optional[TokenBucket]:
+        if not rate:
+            return bucket
+        if bucket is None:
+            return TokenBucket(rate=rate)
+        if rate != bucket.rate and (name, rate) not in self.conflicts:
+            # clients are recreated every cycle, so each conflict is only reported once
+            self.conflicts.add((name, rate))
+            print('Warning', f'conflicting {name} for {self.host}, using {min(rate, bucket.rate)}')
+        if rate < bucket.rate:
+            bucket.rate = rate
+            bucket.capacity = max(rate, 1.0)
+            bucket.tokens = min(bucket.tokens, bucket.capacity)
+        return bucket
+
+    def acquire(self) -> float:
+        # returns the bytes reserved for this request, to be settled with consume_bytes once the size is known
+        with self.lock:
+            wait = 0.0
+            reserved = 0.0
+            if self.request_bucket is not None:
+                wait = max(wait, self.request_bucket.reserve(1))
+            if self.byte_bucket is not None:
+                # each caller reserves a typical response up front, so concurrent callers queue behind each other
+                reserved = self.bytes / self.responses if self.responses else 0.0
+                wait = max(wait, self.byte_bucket.reserve(reserved))
+            self.requests += 1
+            if wait > 0:
+                self.waits += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+        if wait > 0:
+            _waits_cancelled.wait(wait)
+        return reserved
+
+    def consume_bytes(self, size: int, reserved: float = 0.0) -> None:
+        # the difference from the reservation is charged, or refunded, against the requests queued after this one
+        with self.lock:
+            self.bytes += size
+            self.responses += 1
+            if self.byte_bucket is not None:
+                if size >= reserved:
+                    self.byte_bucket.reserve(size - reserved)
+                else:
+                    self.byte_bucket.refund(reserved - size)
+
+    def get_wait_stats(self) -> typing.Dict[str, typing.Any]:
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'bytes': self.bytes,
+                'waits': self.waits,
+                'totalWaitSeconds': round(self.total_wait, 3),
+                'maxWaitSeconds': round(self.max_wait, 3),
+                'meanWaitSeconds': round(self.total_wait / self.requests, 3) if self.requests else 0.0,
+            }
+
+
+_limiters: typing.Dict[str, HostRateLimiter] = {}
+_limiters_lock = threading.Lock()
+# set on shutdown so callers stop sleeping for tokens, the few requests left to wind down go out unthrottled
+_waits_cancelled = threading.Event()
+
+
+def get_host_rate_limiter(*,
+                          host: str,
+                          max_requests_per_second: typing.Optional[float] = None,
+                          max_bytes_per_second: typing.Optional[float] = None) -> HostRateLimiter:
+    # shared per host so every client talking to the same device draws from one budget
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = HostRateLimiter(host=host,
+                                              max_requests_per_second=max_requests_per_second,
+                                              max_bytes_per_second=max_bytes_per_second)
+        else:
+            _limiters[host].restrict(max_requests_per_second=max_requests_per_second,
+                                     max_bytes_per_second=max_bytes_per_second)
+        return _limiters[host]
+
+
+def get_wait_stats() -> typing.Dict[str, typing.Dict[str, typing.Any]]:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.host: limiter.get_wait_stats() for limiter in limiters}
+
+
+def cancel_waits() -> None:
+    _waits_cancelled.set()
@@ -1,4 +1,4 @@
-from marshmallow import Schema, fields, post_load, post_dump, validates_schema, ValidationError
+from marshmallow import Schema, fields, post_load, post_dump, validate, validates_schema, ValidationError
 
 import resilio_model
 
@@ -41,6 +41,8 @@ class ConnectionInfoSchema(BaseSchema):
     password = fields.Str(missing=None)
     auth = fields.Str(data_key='auth', missing=None)
     verify_ssl = fields.Bool(data_key='verifySSL', required=False)
+    max_requests_per_second = fields.Float(data_key='maxRequestsPerSecond', missing=None, validate=validate.Range(min=0, min_inclusive=False))
+    max_bytes_per_second = fields.Float(data_key='maxBytesPerSecond', missing=None, validate=validate.Range(min=0, min_inclusive=False))
 
     @validates_schema
     def validate_mutually_exclusive_values(self, data, partial, many):
@@ -99,6 +101,33 @@ class FoldersSchema(BaseSchema):
         return resilio_model.Folders(**data)
 
 
+class FolderSyncStatusSchema(BaseSchema):
+    # ignore unmapped fields
+    class Meta:
+        unknown = None
+
+    folder_id = fields.Str(data_key='folderid')
+    size = fields.Int(required=False, allow_none=True)
+    remain = fields.Int(required=False, allow_none=True)
+    error = fields.Str(required=False, allow_none=True)
+
+    @post_load
+    def make_object(self, data, **kwargs):
+        return resilio_model.FolderSyncStatus(**data)
+
+
+class FolderSyncStatusesSchema(BaseSchema):
+    # ignore unmapped fields
+    class Meta:
+        unknown = None
+
+    folders = fields.List(fields.Nested(FolderSyncStatusSchema), required=False)
+
+    @post_load
+    def make_object(self, data, **kwargs):
+        return resilio_model.FolderSyncStatuses(**data)
+
+
 class IdentitySchema(BaseSchema):
     device_name = fields.Str(data_key='devicename')
     id = fields.Str()
@@ -0,0 +1,228 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import typing
+import urllib.parse
+import zlib
+
+import requests
+
+import resilio_model
+
+
+# values never written to a cassette in the clear
+REDACTED_KEYS = {'secret', 'readonlysecret', 'encryptedsecret', 'token', 'auth', 'password'}
+# params that change on every request and are ignored when matching
+VOLATILE_PARAMS = {'t', 'token'}
+REDACTED_PREFIX = 'redacted-'
+
+
+def redact_value(value: typing.Any) -> typing.Any:
+    # deterministic so a secret returned by one recorded response still matches a later request using it
+    if not isinstance(value, str) or value.startswith(REDACTED_PREFIX):
+        return value
+    return REDACTED_PREFIX + hashlib.sha256(value.encode('utf-8')).hexdigest()[0:16]
+
+
+def redact_data(data: typing.Any) -> typing.Any:
+    if isinstance(data, dict):
+        return {key: redact_value(value) if key.lower() in REDACTED_KEYS else redact_data(value)
+                for key, value in data.items()}
+    if isinstance(data, list):
+        return [redact_data(value) for value in data]
+    return data
+
+
+def redact_body(text: str) -> str:
+    try:
+        return json.dumps(redact_data(json.loads(text)))
+    except ValueError:
+        # token.html carries the csrf token as element text
+        return re.sub(r'>([^<\s]+)<', lambda match: f'>{redact_value(match.group(1))}<', text)
+
+
+def normalize_param(name: str, value: str) -> typing.Any:
+    if name.lower() in REDACTED_KEYS:
+        return redact_value(value)
+    try:
+        # json params such as setlocalstorage values are compared by content, not key order
+        return redact_data(json.loads(value))
+    except ValueError:
+        return value
+
+
+def get_request_key(url: str) -> str:
+    parsed = urllib.parse.urlsplit(url)
+    params = urllib.parse.parse_qs(parsed.query)
+    key = {
+        'path': parsed.path,
+        'params': {name: normalize_param(name, values[0])
+                   for name, values in params.items() if name not in VOLATILE_PARAMS},
+    }
+    return json.dumps(key, sort_keys=True)
+
+
+class TransportResponse:
+    def __init__(self, *, url: str, status_code: int, text: str) -> None:
+        self.url = url
+        self.status_code = status_code
+        self.text = text
+        self.content = text.encode('utf-8')
+
+    def json(self) -> typing.Any:
+        return json.loads(self.text)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(f'{self.status_code} Error for url: {self.url}', response=self)
+
+
+class RequestsTransport:
+    rate_limited = True
+
+    def __init__(self, *, timeout: typing.Optional[float] = 60) -> None:
+        self.session = requests.Session()
+        self.timeout = timeout
+
+    def get(self, url: str, *, headers: typing.Dict[str, str], verify: bool):
+        # bounded so a hung host cannot hold up shutdown
+        return self.session.get(url, headers=headers, verify=verify, timeout=self.timeout)
+
+
+class RequestsTransportFactory:
+    def __init__(self, *, timeout: typing.Optional[float] = 60) -> None:
+        self.timeout = timeout
+
+    def __call__(self, connection_info: resilio_model.ConnectionInfo) -> RequestsTransport:
+        return RequestsTransport(timeout=self.timeout)
+
+
+class Cassette:
+    # every recording session writes its own file, so an unclean exit can only damage the tail of that session
+    def __init__(self, *, directory: str, name: str) -> None:
+        self.directory = directory
+        self.name = name
+        self.path = None
+        self.lock = threading.Lock()
+        self.writer = None
+        self.interactions: typing.Optional[typing.Dict[str, typing.List[typing.Dict[str, typing.Any]]]] = None
+
+    def record(self, url: str, response, elapsed: float) -> None:
+        interaction = {
+            'key': get_request_key(url),
+            'status': response.status_code,
+            'body': redact_body(response.text),
+            'elapsed': round(elapsed, 4),
+        }
+        with self.lock:
+            if self.writer is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self.path = os.path.join(self.directory, f'{self.name}.{time.time_ns()}.jsonl.gz')
+                self.writer = gzip.open(self.path, 'wt', encoding='utf-8')
+            self.writer.write(json.dumps(interaction))
+            self.writer.write('\n')
+            self.writer.flush()
+
+    def next(self, url: str) -> typing.Dict[str, typing.Any]:
+        key = get_request_key(url)
+        with self.lock:
+            if self.interactions is None:
+                self._load()
+            queue = self.interactions.get(key)
+            if not queue:
+                raise KeyError(f'no recorded response for {key} in {self.name} cassettes')
+            # the last response for a request is served repeatedly so replayed cycles can loop
+            return queue.pop(0) if len(queue) > 1 else queue[0]
+
+    def get_paths(self) -> typing.List[str]:
+        # sessions are named by start time, oldest first; a single unsuffixed file is an older recording
+        pattern = re.compile(re.escape(self.name) + r'(\.(\d+))?\.jsonl\.gz$')
+        matches = [pattern.match(file_name) for file_name in os.listdir(self.directory)] if os.path.isdir(self.directory) else []
+        matches = [match for match in matches if match is not None]
+        return [os.path.join(self.directory, match.group(0))
+                for match in sorted(matches, key=lambda match: int(match.group(2) or 0))]
+
+    def _load(self) -> None:
+        self.interactions = {}
+        for path in self.get_paths():
+            try:
+                with gzip.open(path, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        interaction = json.loads(line)
+                        self.interactions.setdefault(interaction['key'], []).append(interaction)
+            except (EOFError, ValueError, OSError, zlib.error):
+                # a session that was not closed cleanly ends mid-record, keep what was read
+                print('Warning', f'cassette {path} is truncated, replaying the records before the damage')
+
+    def close(self) -> None:
+        with self.lock:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+
+
+class RecordingTransport:
+    rate_limited = True
+
+    def __init__(self, *, cassette: Cassette, transport: typing.Optional[RequestsTransport] = None) -> None:
+        self.cassette = cassette
+        self.transport = transport if transport is not None else RequestsTransport()
+
+    def get(self, url: str, *, headers: typing.Dict[str, str], verify: bool):
+        started = time.monotonic()
+        resp = self.transport.get(url, headers=headers, verify=verify)
+        self.cassette.record(url, resp, time.monotonic() - started)
+        return resp
+
+
+class ReplayTransport:
+    rate_limited = False
+
+    def __init__(self, *, cassette: Cassette, speedup: float = 1.0) -> None:
+        self.cassette = cassette
+        self.speedup = speedup
+
+    def get(self, url: str, *, headers: typing.Dict[str, str], verify: bool) -> TransportResponse:
+        interaction = self.cassette.next(url)
+        if self.speedup > 0:
+            time.sleep(interaction['elapsed'] / self.speedup)
+        return TransportResponse(url=url, status_code=interaction['status'], text=interaction['body'])
+
+
+class CassetteTransportFactory:
+    RECORD = 'record'
+    REPLAY = 'replay'
+
+    def __init__(self, *, directory: str, mode: str, speedup: float = 1.0, timeout: typing.Optional[float] = 60) -> None:
+        if mode not in (CassetteTransportFactory.RECORD, CassetteTransportFactory.REPLAY):
+            raise ValueError(f'unknown transport mode {mode}')
+        self.directory = directory
+        self.mode = mode
+        self.speedup = speedup
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.cassettes: typing.Dict[str, Cassette] = {}
+
+    def __call__(self, connection_info: resilio_model.ConnectionInfo):
+        cassette = self.get_cassette(connection_info.host)
+        if self.mode == CassetteTransportFactory.RECORD:
+            return RecordingTransport(cassette=cassette, transport=RequestsTransport(timeout=self.timeout))
+        return ReplayTransport(cassette=cassette, speedup=self.speedup)
+
+    def get_cassette(self, host: str) -> Cassette:
+        # one cassette per host, shared by every client of that host
+        with self.lock:
+            if host not in self.cassettes:
+                name = re.sub(r'[^A-Za-z0-9_.-]+', '_', host).strip('_')
+                self.cassettes[host] = Cassette(directory=self.directory, name=name)
+            return self.cassettes[host]
+
+    def close(self) -> None:
+        with self.lock:
+            cassettes = list(self.cassettes.values())
+        for cassette in cassettes:
+            cassette.close()